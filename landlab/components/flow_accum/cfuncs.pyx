@@ -35,32 +35,39 @@ cpdef _add_to_stack(DTYPE_INT_t l, DTYPE_INT_t j,
 
 
 @cython.boundscheck(False)
-cpdef _accumulate_to_n(DTYPE_INT_t np, DTYPE_INT_t q,
+@cython.wraparound(False)
+cpdef _accumulate_to_n(DTYPE_INT_t np,
                        np.ndarray[DTYPE_INT_t, ndim=1] s,
-                       np.ndarray[DTYPE_INT_t, ndim=2] r,
-                       np.ndarray[DTYPE_FLOAT_t, ndim=2] p,
-                       np.ndarray[DTYPE_FLOAT_t, ndim=1] drainage_area,
-                       np.ndarray[DTYPE_FLOAT_t, ndim=1] discharge):
+                       np.ndarray[DTYPE_INT_t, ndim=1] offset,
+                       np.ndarray[DTYPE_INT_t, ndim=1] r,
+                       np.ndarray[DTYPE_FLOAT_t, ndim=1] p,
+                       np.ndarray[cython.floating, ndim=1] drainage_area,
+                       np.ndarray[cython.floating, ndim=1] discharge):
     """
     Accumulates drainage area and discharge, permitting transmission losses.
+
+    The receivers of node i, and the proportion of flow going to each, are
+    r[offset[i]:offset[i + 1]] and p[offset[i]:offset[i + 1]]. These must
+    only include links that carry flow to another node. drainage_area and
+    discharge may be either single or double precision.
     """
-    cdef int donor, recvr, i, v
-    cdef float accum, proportion
+    cdef int donor, recvr, i, n
+    cdef double accum, proportion
 
     # Iterate backward through the list, which means we work from upstream to
-    # downstream.
-    for i in range(np-1, -1, -1):
-        donor = s[i]
-        for v in range(q):
-            recvr = r[donor, v]
-            proportion = p[donor, v]
-            if proportion > 0.:
-                if donor != recvr:
-                    drainage_area[recvr] += proportion*drainage_area[donor]
-                    accum = discharge[recvr] + proportion*discharge[donor]
-                    if accum < 0.:
-                        accum = 0.
-                    discharge[recvr] = accum
+    # downstream. Nothing here touches Python objects, so release the GIL to
+    # let other threads (accumulating on other grids, say) run alongside.
+    with nogil:
+        for i in range(np-1, -1, -1):
+            donor = s[i]
+            for n in range(offset[donor], offset[donor + 1]):
+                recvr = r[n]
+                proportion = p[n]
+                drainage_area[recvr] += proportion*drainage_area[donor]
+                accum = discharge[recvr] + proportion*discharge[donor]
+                if accum < 0.:
+                    accum = 0.
+                discharge[recvr] = accum
 
 
 @cython.boundscheck(False)
@@ -103,20 +110,53 @@ cpdef _make_donors(DTYPE_INT_t np,
 
 
 @cython.boundscheck(False)
-cpdef _make_donors_to_n(DTYPE_INT_t np,
-                  DTYPE_INT_t q,
-                  np.ndarray[DTYPE_INT_t, ndim=1] w,
-                  np.ndarray[DTYPE_INT_t, ndim=1] D,
-                  np.ndarray[DTYPE_INT_t, ndim=1] delta,
-                  np.ndarray[DTYPE_INT_t, ndim=2] r,
-                  np.ndarray[DTYPE_FLOAT_t, ndim=2] p,
-                  ):
-    """Determines number of donors for route to n"""
-    cdef int ri, i, v, ind
-    for v in range(q):
-        for i in range(np):
-            ri = r[i, v]
-            if p[i, v] > 0:
-                ind = delta[ri] + w[ri]
-                D[ind] = i
-                w[ri] += 1
+@cython.wraparound(False)
+cpdef DTYPE_INT_t _make_stack_to_n(np.ndarray[DTYPE_INT_t, ndim=1] delta,
+                                   np.ndarray[DTYPE_INT_t, ndim=1] D,
+                                   np.ndarray[DTYPE_INT_t, ndim=1] base,
+                                   np.ndarray[DTYPE_INT_t, ndim=1] s):
+    """Adds nodes to the route to n stack, s, in downstream to upstream order.
+
+    This is a breadth-first (Kahn) topological sort of the donor graph given
+    by delta and D, starting from the base-level nodes. A node is added to
+    the stack once all of its receivers are in the stack so each donor link is
+    walked exactly once. Returns the number of nodes added to the stack.
+    """
+    cdef int n_nodes = delta.shape[0] - 1
+    cdef int node, donor, i, n
+    cdef int head = 0
+    cdef int tail = 0
+    # a node never has more receivers than fit in 32 bits, so keep the
+    # counters small.
+    cdef np.ndarray[np.int32_t, ndim=1] num_remaining = np.zeros(
+        n_nodes, dtype=np.int32
+    )
+
+    # count the receivers of each node that have yet to be added to the stack.
+    for node in range(n_nodes):
+        for n in range(delta[node], delta[node + 1]):
+            donor = D[n]
+            if donor != node:
+                num_remaining[donor] += 1
+
+    # base-level nodes go first. Flag them with -1 so they are not added again.
+    for i in range(base.shape[0]):
+        node = base[i]
+        if num_remaining[node] >= 0:
+            s[tail] = node
+            tail += 1
+            num_remaining[node] = -1
+
+    # a donor is added the last time it is visited.
+    while head < tail:
+        node = s[head]
+        head += 1
+        for n in range(delta[node], delta[node + 1]):
+            donor = D[n]
+            if donor != node:
+                num_remaining[donor] -= 1
+                if num_remaining[donor] == 0:
+                    s[tail] = donor
+                    tail += 1
+
+    return tail
@@ -43,20 +43,24 @@ If you simply want the ordered list by itself, use::
 
     s = make_ordered_node_array_to_n(r, p, b)
 
+The stack construction and the accumulation loops are implemented in cython
+(see cfuncs.pyx, shared with flow_accum_bw); the functions here prepare the
+arrays they work on.
+
 Created: KRB Oct 2016 (modified from flow_accumu_bw)
 """
-import numpy
+import numpy as np
 
 from landlab.core.utils import as_id_array
 
-from .cfuncs import _accumulate_to_n, _make_donors_to_n
+from .cfuncs import _accumulate_to_n, _make_stack_to_n
 
 
 class _DrainageStack_to_n:
 
     """Implementation of the DrainageStack_to_n class.
 
-    The _DrainageStack_to_n() class implements a set based approach to
+    The _DrainageStack_to_n() class implements a breadth first approach to
     constructing a stack with similar properties to the stack constructed by
     Braun & Willet (2013). It constructs an list, s, of all nodes in the grid
     such that a given node is always located earlier in the list than all
@@ -65,12 +69,13 @@ class _DrainageStack_to_n:
     It is used by the make_ordered_node_array_to_n() function.
     """
 
-    def __init__(self, delta, D, num_receivers):
+    def __init__(self, delta, D, num_receivers=None):
 
         """Creates the stack array s and stores references to delta and D.
 
         Initialization of the _DrainageStack_to_n() class including
-        storing delta and D.
+        storing delta and D. num_receivers is no longer needed to construct
+        the stack and is only stored.
         """
 
         self.num_receivers = num_receivers
@@ -89,20 +94,19 @@ class _DrainageStack_to_n:
         route to 1 method of Braun and Willet (2013) and the route to N method
         presented here.
 
-        Rather than recursively moving up the tributary tree this method uses
-        sets test that a node is downstream and add it to the stack. Both
-        methods are functionally depth first searches. The method that Braun
-        and Willet (2013) implement is optimized given that each node only has
-        one receiver. This method is optimized to visit more than one vertex/
-        node of the graph at a time.
-
-        An important note: Since sets are un-ordered, we cannot expect the
-        stack to be exactly the same each time. It will always put nodes that
-        are downstream before those that are upstream, but because it will move
-        up multiple branches at the same time, it may put three nodes into the
-        stack at the same time that are on different branches of the flow
-        network. Because these nodes are in different parts of the network,
-        the relative order of them does not matter.
+        Rather than recursively moving up the tributary tree this method
+        performs a breadth first search (a topological sort) of the donor
+        graph. A node is added to the stack only once all of its receivers
+        have been added, which means that each donor link is walked exactly
+        once. The method that Braun and Willet (2013) implement is optimized
+        given that each node only has one receiver.
+
+        An important note: Because the search moves up multiple branches at
+        the same time, it may put nodes that are on different branches of the
+        flow network next to each other in the stack. Because these nodes are
+        in different parts of the network, the relative order of them does not
+        matter. Nodes that cannot be reached from the base level nodes are
+        placed at the start of the stack.
 
         For example, in the example below, the nodes 1 and 7 must be added
         after 5 but before 2 and 6.
@@ -130,80 +134,21 @@ class _DrainageStack_to_n:
         >>> len(set([0, 3, 8])-set(ds.s[6:9]))
         0
         """
-        # create base nodes set
-        try:
-            base = set(l)
-        except TypeError:
-            base = set([l])
-
-        # instantiate the time keeping variable i, and a variable to keep track
-        # of the visit time. Using visit time allows us to itterate through
-        # the entire graph and make sure that only put a node in the stack
-        # the last time it is visited.
-
-        i = 0
-        visit_time = -1 * numpy.ones((self.delta.size - 1))
-        num_visits = numpy.zeros((self.delta.size - 1))
-
-        # deal with the first node, which goes to it
-        visit_time[list(base)] = i
-        num_visits[list(base)] += 1
-
-        i = 1
-        visited = set([])
-        for node_i in base:
-            # select the nodes to visit
-            visit = set(self.D[self.delta[node_i] : self.delta[node_i + 1]])
-            visit = visit - base
-
-            # record the visit time.
-            visit_time[list(visit)] = i
-
-            # record that they have been visited.
-            num_visits[list(visit)] += 1
-
-            visited.update(list(visit))
-
-        visited = numpy.array(list(visited))
-        if visited.size > 0:
-            visited_enough = num_visits[visited] == self.num_receivers[visited]
-            completed = set(visited[visited_enough])
-        else:
-            completed = {}
-        # recurse through the remainder. Only look above completed nodes,
-        # this prevents repeat link walking.
-        while len(completed) > 0:
-            # increase counter
-            i += 1
-
-            visited = set([])
-            new_completes = set([])
-
-            for node_i in completed:
-
-                # select the nodes to visit
-                visit = self.D[self.delta[node_i] : self.delta[node_i + 1]]
-                # record the visit time.
-                visit_time[visit] = i
-
-                # record that they have been visited.
-                num_visits[visit] += 1
-
-                # add nodes that have been visited enough times to complete
-                # to the upstream stack. We can ignore the rest, they will
-                # be re-visited. This should reduce the number of times each
-                # link is walked to the number of active links.
-                visited_enough = (
-                    num_visits[numpy.array(visit)]
-                    == self.num_receivers[numpy.array(visit)]
-                )
-
-                visited.update(visit)
-                new_completes.update(visit[visited_enough])
-            completed = new_completes
-
-        # the stack is the argsort of visit time.
-        self.s = numpy.argsort(visit_time)
+        base = np.atleast_1d(as_id_array(l))
+        delta = np.ascontiguousarray(as_id_array(self.delta))
+        D = np.ascontiguousarray(as_id_array(self.D))
+
+        # the cfunc fills the stack in order, starting with the base nodes.
+        stack = np.empty(delta.size - 1, dtype=int)
+        n_stacked = _make_stack_to_n(delta, D, base, stack)
+
+        if n_stacked < stack.size:
+            # nodes that are never reached go first.
+            is_stacked = np.zeros(stack.size, dtype=bool)
+            is_stacked[stack[:n_stacked]] = True
+            stack = np.concatenate((np.flatnonzero(~is_stacked), stack[:n_stacked]))
+
+        self.s = stack
 
 
 def _make_number_of_donors_array_to_n(r, p):
@@ -255,14 +200,10 @@ def _make_number_of_donors_array_to_n(r, p):
     >>> nd
     array([0, 2, 2, 0, 4, 4, 2, 3, 1, 0])
     """
-    nd = numpy.zeros(r.shape[0], dtype=int)
-
     # filter r based on p and flatten
-    r_filter_flat = r.flatten()[p.flatten() > 0]
-
-    max_index = numpy.amax(r_filter_flat)
+    r_filter_flat = r.ravel()[p.ravel() > 0]
 
-    nd[: (max_index + 1)] = numpy.bincount(r_filter_flat)
+    nd = np.bincount(r_filter_flat, minlength=r.shape[0])
     return nd
 
 
@@ -296,11 +237,9 @@ def _make_delta_array_to_n(nd):
     >>> sum(nd) == max(delta)
     True
     """
-    nt = sum(nd)
-    np = len(nd)
-    delta = numpy.zeros(np + 1, dtype=int)
-    delta.fill(nt)
-    delta[-2::-1] -= numpy.cumsum(nd[::-1])
+    n = nd.shape[0]
+    delta = np.zeros(n + 1, dtype=int)
+    np.cumsum(nd, out=delta[1:])
 
     return delta
 
@@ -316,7 +255,8 @@ def _make_array_of_donors_to_n(r, p, delta):
     Table 1 (except that here the ID numbers are one less, because we number
     indices from zero).
 
-    Vectorized - inefficiently! - DEJH, 5/20/14
+    Within the list for each node, donors are ordered first by the receiver
+    column (v) they appear in and then by node ID.
 
     Examples
     --------
@@ -348,16 +288,132 @@ def _make_array_of_donors_to_n(r, p, delta):
     >>> D
     array([0, 2, 0, 3, 1, 4, 5, 7, 6, 1, 2, 7, 3, 8, 9, 6, 8, 9])
     """
-    np = r.shape[0]
-    q = r.shape[1]
-    nt = delta[-1]
+    _, D = _make_donor_arrays_to_n(r, p)
 
-    w = numpy.zeros(np, dtype=int)
-    D = numpy.zeros(nt, dtype=int)
+    return D
 
-    _make_donors_to_n(np, q, w, D, delta, r, p)
 
-    return D
+def _make_donor_arrays_to_n(r, p):
+
+    """Creates and returns the delta and donor arrays.
+
+    Builds both the delta array (see _make_delta_array_to_n) and the array
+    of donors (see _make_array_of_donors_to_n) with a single pass over r and
+    p.
+
+    Parameters
+    ----------
+    r : ndarray size (np, q) where r[i,:] gives all receivers of node i. Each
+        node recieves flow fom up to q donors.
+
+    p : ndarray size (np, q) where p[i,v] give the proportion of flow going
+        from node i to the receiver listed in r[i,v].
+
+    Returns
+    -------
+    tuple of ndarray of int
+        Delta array and array of donors.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from landlab.components.flow_accum.flow_accum_to_n import(
+    ... _make_donor_arrays_to_n)
+    >>> r = np.array([[ 1,  2],
+    ...               [ 4,  5],
+    ...               [ 1,  5],
+    ...               [ 6,  2],
+    ...               [ 4, -1],
+    ...               [ 4, -1],
+    ...               [ 5,  7],
+    ...               [ 4,  5],
+    ...               [ 6,  7],
+    ...               [ 7,  8]])
+    >>> p = np.array([[ 0.6,   0.4 ],
+    ...               [ 0.85,  0.15],
+    ...               [ 0.65,  0.35],
+    ...               [ 0.9,   0.1 ],
+    ...               [ 1.,    0.  ],
+    ...               [ 1.,    0.  ],
+    ...               [ 0.75,  0.25],
+    ...               [ 0.55,  0.45],
+    ...               [ 0.8,   0.2 ],
+    ...               [ 0.95,  0.05]])
+    >>> delta, D = _make_donor_arrays_to_n(r, p)
+    >>> delta
+    array([ 0,  0,  2,  4,  4,  8,  12,  14, 17, 18, 18])
+    >>> D
+    array([0, 2, 0, 3, 1, 4, 5, 7, 6, 1, 2, 7, 3, 8, 9, 6, 8, 9])
+    """
+    # donor and receiver of every link that carries flow, ordered by
+    # receiver column and then by donor.
+    v, donors = np.nonzero(p.T > 0)
+    receivers = r[donors, v]
+
+    nd = np.bincount(receivers, minlength=r.shape[0])
+    delta = np.zeros(r.shape[0] + 1, dtype=int)
+    np.cumsum(nd, out=delta[1:])
+
+    # a stable sort keeps that order within the list of each receiver.
+    D = donors[np.argsort(receivers, kind="stable")]
+
+    return delta, D
+
+
+def _make_receiver_arrays_to_n(r, p):
+
+    """Creates and returns the receivers of each node that carry flow.
+
+    Only links with a positive proportion of flow going to a node other than
+    the donor itself are kept. Receivers and proportions are packed into flat
+    arrays, ordered by donor, with an offset array that gives where each
+    donor's list begins.
+
+    Parameters
+    ----------
+    r : ndarray size (np, q) where r[i,:] gives all receivers of node i. Each
+        node recieves flow fom up to q donors.
+
+    p : ndarray size (np, q) where p[i,v] give the proportion of flow going
+        from node i to the receiver listed in r[i,v].
+
+    Returns
+    -------
+    tuple of ndarray
+        Offset array, receivers and proportions.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from landlab.components.flow_accum.flow_accum_to_n import(
+    ... _make_receiver_arrays_to_n)
+    >>> r = np.array([[ 1,  2],
+    ...               [ 4,  5],
+    ...               [ 2, -1],
+    ...               [ 1,  2]])
+    >>> p = np.array([[ 0.6,   0.4 ],
+    ...               [ 0.85,  0.15],
+    ...               [ 1.,    0.  ],
+    ...               [ 1.,    0.  ]])
+    >>> offset, receivers, proportions = _make_receiver_arrays_to_n(r, p)
+    >>> offset
+    array([0, 2, 4, 4, 5])
+    >>> receivers
+    array([1, 2, 4, 5, 1])
+    >>> proportions
+    array([ 0.6 ,  0.4 ,  0.85,  0.15,  1.  ])
+    """
+    node_id = np.arange(r.shape[0])
+    is_flowing = (p > 0) & (r != node_id[:, None])
+
+    offset = np.zeros(r.shape[0] + 1, dtype=int)
+    np.cumsum(is_flowing.sum(axis=1), out=offset[1:])
+
+    return (
+        offset,
+        as_id_array(r[is_flowing]),
+        np.ascontiguousarray(p[is_flowing], dtype=float),
+    )
 
 
 def make_ordered_node_array_to_n(receiver_nodes, receiver_proportion):
@@ -409,23 +465,127 @@ def make_ordered_node_array_to_n(receiver_nodes, receiver_proportion):
     >>> len(set([0, 3, 8])-set(s[6:9]))
     0
     """
-    node_id = numpy.arange(receiver_nodes.shape[0])
-    baselevel_nodes = numpy.where(node_id == receiver_nodes[:, 0])[0]
-    nd = _make_number_of_donors_array_to_n(receiver_nodes, receiver_proportion)
-    delta = _make_delta_array_to_n(nd)
-    D = _make_array_of_donors_to_n(receiver_nodes, receiver_proportion, delta)
+    delta, D = _make_donor_arrays_to_n(receiver_nodes, receiver_proportion)
+
+    return _make_ordered_node_array_from_donors_to_n(
+        delta, D, _find_baselevel_nodes_to_n(receiver_nodes)
+    )
 
-    num_receivers = numpy.sum(receiver_nodes >= 0, axis=1)
 
-    dstack = _DrainageStack_to_n(delta, D, num_receivers)
+def _find_baselevel_nodes_to_n(r):
+    """Find base-level nodes, whose first receiver is themselves.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from landlab.components.flow_accum.flow_accum_to_n import(
+    ... _find_baselevel_nodes_to_n)
+    >>> r = np.array([[ 1,  2],
+    ...               [ 1, -1],
+    ...               [ 1,  3],
+    ...               [ 3, -1]])
+    >>> _find_baselevel_nodes_to_n(r)
+    array([1, 3])
+    """
+    return np.flatnonzero(r[:, 0] == np.arange(r.shape[0]))
+
+
+def _make_ordered_node_array_from_donors_to_n(delta, D, baselevel_nodes):
+    """Create an array of node IDs from already built donor arrays.
+
+    Same as make_ordered_node_array_to_n but for callers that already have
+    the delta and donor arrays (and base-level nodes), so that they are not
+    built a second time.
+    """
+    dstack = _DrainageStack_to_n(delta, D, None)
     construct_it = dstack.construct__stack
 
-    construct_it(baselevel_nodes)  # don't think this is a bottleneck, so no C++
+    construct_it(baselevel_nodes)
     return dstack.s
 
 
+class _DonorArrays_to_n:
+
+    """Cache of the delta, donor and stack arrays of a route-to-n network.
+
+    Building delta, D and s is most of the work of route-to-n flow
+    accumulation, but they depend only on the receivers, r, and on which
+    links carry flow (p > 0), not on the proportions themselves. In a model
+    time loop these often do not change from one step to the next, so the
+    arrays are kept and only rebuilt when they do.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from landlab.components.flow_accum.flow_accum_to_n import(
+    ... _DonorArrays_to_n)
+    >>> r = np.array([[ 1,  2],
+    ...               [ 3, -1],
+    ...               [ 3,  1],
+    ...               [ 3, -1]])
+    >>> p = np.array([[ 0.5,  0.5],
+    ...               [ 1. ,  0. ],
+    ...               [ 0.2,  0.8],
+    ...               [ 1. ,  0. ]])
+    >>> donors = _DonorArrays_to_n()
+    >>> donors.update(r, p)
+    True
+    >>> donors.s
+    array([3, 1, 2, 0])
+
+    Changing proportions without changing which links carry flow keeps the
+    arrays,
+
+    >>> p[2] = [0.4, 0.6]
+    >>> donors.update(r, p)
+    False
+
+    but routing all of the flow from node 2 to node 3 rebuilds them.
+
+    >>> p[2] = [1.0, 0.0]
+    >>> donors.update(r, p)
+    True
+    >>> donors.delta
+    array([0, 0, 1, 2, 5])
+    """
+
+    def __init__(self):
+        self._r = None
+        self._is_flowing = None
+        self.delta = None
+        self.D = None
+        self.s = None
+
+    def update(self, r, p):
+        """Rebuild the arrays if the flow network has changed.
+
+        Returns True if the arrays were rebuilt, False if the cached ones
+        were kept.
+        """
+        is_flowing = p > 0
+        if (
+            self._r is not None
+            and np.array_equal(r, self._r)
+            and np.array_equal(is_flowing, self._is_flowing)
+        ):
+            return False
+
+        self._r = r.copy()
+        self._is_flowing = is_flowing
+
+        delta, D = _make_donor_arrays_to_n(r, p)
+        self.delta = as_id_array(delta)
+        self.D = as_id_array(D)
+        self.s = as_id_array(
+            _make_ordered_node_array_from_donors_to_n(
+                self.delta, self.D, _find_baselevel_nodes_to_n(r)
+            )
+        )
+        return True
+
+
 def find_drainage_area_and_discharge_to_n(
-    s, r, p, node_cell_area=1.0, runoff=1.0, boundary_nodes=None
+    s, r, p, node_cell_area=1.0, runoff=1.0, boundary_nodes=None, dtype=float
 ):
 
     """Calculate the drainage area and water discharge at each node.
@@ -449,6 +609,10 @@ def find_drainage_area_and_discharge_to_n(
     boundary_nodes: list, optional
         Array of boundary nodes to have discharge and drainage area set to
         zero. Default value is None.
+    dtype : {float, numpy.float32}, optional
+        Data type of drainage area and discharge. Single precision halves the
+        memory used, at the cost of precision. Default is float (double
+        precision).
 
     Returns
     -------
@@ -501,26 +665,39 @@ def find_drainage_area_and_discharge_to_n(
     >>> q.round(4)
     array([  1.    ,   2.575 ,   1.5   ,   1.    ,  10.    ,   5.2465,
              2.74  ,   2.845 ,   1.05  ,   1.    ])
+
+    Accumulate in single precision instead.
+
+    >>> a, q = find_drainage_area_and_discharge_to_n(s, r, p, dtype=np.float32)
+    >>> a.dtype, q.dtype
+    (dtype('float32'), dtype('float32'))
+    >>> a.round(4)
+    array([  1.    ,   2.575 ,   1.5   ,   1.    ,  10.    ,   5.2465,
+             2.74  ,   2.845 ,   1.05  ,   1.    ], dtype=float32)
     """
     # Number of points
-    np = r.shape[0]
-    q = r.shape[1]
+    n_nodes = r.shape[0]
+
+    # The cfunc expects contiguous id and float arrays.
+    s = np.ascontiguousarray(as_id_array(s))
+    offset, r_flow, p_flow = _make_receiver_arrays_to_n(r, p)
 
     # Initialize the drainage_area and discharge arrays. Drainage area starts
     # out as the area of the cell in question, then (unless the cell has no
     # donors) grows from there. Discharge starts out as the cell's local runoff
     # rate times the cell's surface area.
-    drainage_area = numpy.zeros(np) + node_cell_area
-    discharge = numpy.zeros(np) + node_cell_area * runoff
+    drainage_area = np.full(n_nodes, node_cell_area, dtype=dtype)
+    discharge = np.full(n_nodes, node_cell_area * runoff, dtype=dtype)
 
-    # Optionally zero out drainage area and discharge at boundary nodes
+    # Optionally zero out drainage area and discharge at boundary nodes. This
+    # is done before accumulating so the cfunc need not check for them.
     if boundary_nodes is not None:
         drainage_area[boundary_nodes] = 0
         discharge[boundary_nodes] = 0
 
     # Call the cfunc to work accumulate from upstream to downstream, permitting
     # transmission losses
-    _accumulate_to_n(np, q, s, r, p, drainage_area, discharge)
+    _accumulate_to_n(n_nodes, s, offset, r_flow, p_flow, drainage_area, discharge)
     # nodes at channel heads can still be negative with this method, so...
     discharge = discharge.clip(0.0)
 
@@ -637,15 +814,15 @@ def find_drainage_area_and_discharge_to_n_lossy(
     array([ 1.,  1.,  1.,  1.])
     """
     # Number of points
-    np = r.shape[0]
+    n_nodes = r.shape[0]
     q = r.shape[1]
 
     # Initialize the drainage_area and discharge arrays. Drainage area starts
     # out as the area of the cell in question, then (unless the cell has no
     # donors) grows from there. Discharge starts out as the cell's local runoff
     # rate times the cell's surface area.
-    drainage_area = numpy.zeros(np) + node_cell_area
-    discharge = numpy.zeros(np) + node_cell_area * runoff
+    drainage_area = np.zeros(n_nodes) + node_cell_area
+    discharge = np.zeros(n_nodes) + node_cell_area * runoff
 
     # grab the field to ouput loss to
 
@@ -656,7 +833,7 @@ def find_drainage_area_and_discharge_to_n_lossy(
 
     # Iterate backward through the list, which means we work from upstream to
     # downstream.
-    for i in range(np - 1, -1, -1):
+    for i in range(n_nodes - 1, -1, -1):
         donor = s[i]
         for v in range(q):
             recvr = r[donor, v]
@@ -666,7 +843,7 @@ def find_drainage_area_and_discharge_to_n_lossy(
                 if donor != recvr:
                     drainage_area[recvr] += proportion * drainage_area[donor]
                     discharge_head = proportion * discharge[donor]
-                    discharge_remaining = numpy.clip(
+                    discharge_remaining = np.clip(
                         loss_function(discharge_head, donor, lrec, grid),
                         0.0,
                         float("inf"),
@@ -685,12 +862,15 @@ def flow_accumulation_to_n(
     node_cell_area=1.0,
     runoff_rate=1.0,
     boundary_nodes=None,
+    dtype=float,
 ):
 
     """Calculate drainage area and (steady) discharge.
 
     Calculates and returns the drainage area and (steady) discharge at each
     node, along with a downstream-to-upstream ordered list (array) of node IDs.
+    Drainage area and discharge are accumulated with the given dtype (float32
+    or, by default, float64).
 
     Examples
     --------
@@ -755,6 +935,7 @@ def flow_accumulation_to_n(
         node_cell_area,
         runoff_rate,
         boundary_nodes,
+        dtype=dtype,
     )
 
     return a, q, s
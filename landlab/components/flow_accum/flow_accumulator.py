@@ -749,6 +749,7 @@ class FlowAccumulator(Component):
 
         self._D_structure = self._grid.BAD_INDEX * grid.ones(at="link", dtype=int)
         self._nodes_not_in_stack = True
+        self._donor_arrays_to_n = flow_accum_to_n._DonorArrays_to_n()
 
         if len(self._kwargs) > 0:
             kwdstr = " ".join(list(self._kwargs.keys()))
@@ -819,7 +820,7 @@ class FlowAccumulator(Component):
         ...      flow_director='MFD')
         >>> fa.run_one_step()
         >>> fa.link_order_upstream()
-        array([ 5, 14, 10,  6, 11,  7, 23, 19, 15, 20, 16, 28, 24, 29, 25])
+        array([ 5, 10,  6, 14, 11,  7, 19, 15, 23, 20, 16, 28, 24, 29, 25])
         """
         downstream_links = self._grid["node"]["flow__link_to_receiver_node"][
             self._upstream_ordered_nodes
@@ -1125,18 +1126,18 @@ class FlowAccumulator(Component):
             # Get p
             p = self._grid["node"]["flow__receiver_proportions"]
 
-            # step 3. Stack, D, delta construction
-            nd = as_id_array(flow_accum_to_n._make_number_of_donors_array_to_n(r, p))
-            delta = as_id_array(flow_accum_to_n._make_delta_array_to_n(nd))
-            D = as_id_array(flow_accum_to_n._make_array_of_donors_to_n(r, p, delta))
-            s = as_id_array(flow_accum_to_n.make_ordered_node_array_to_n(r, p))
+            # step 3. Stack, D, delta construction. These are only rebuilt if
+            # the links that carry flow have changed since the last call.
+            self._donor_arrays_to_n.update(r, p)
+            delta = self._donor_arrays_to_n.delta
+            D = self._donor_arrays_to_n.D
+            s = self._donor_arrays_to_n.s
 
             # put theese in grid so that depression finder can use it.
             # store the generated data in the grid
             self._grid["node"]["flow__data_structure_delta"][:] = delta[1:]
             self._D_structure = D
 
-            self._grid["node"]["flow__upstream_node_order"][:] = s
             self._grid["node"]["flow__upstream_node_order"][:] = s
 
             # step 4. Accumulate (to one or to N depending on direction method)
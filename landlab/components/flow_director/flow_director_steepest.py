@@ -692,13 +692,11 @@ class FlowDirectorSteepest(_FlowDirectorToOne):
         >>> fd.upstream_node_at_link()
         array([-1, -1, -1,  4, -1, -1, -1, -1, -1, -1, -1, -1])
         """
-        out = -1 * self._grid.ones(at="link", dtype=int)
-        out[self._flow_link_direction == 1] = self._grid.node_at_link_tail[
-            self._flow_link_direction == 1
-        ]
-        out[self._flow_link_direction == -1] = self._grid.node_at_link_head[
-            self._flow_link_direction == -1
-        ]
+        out = np.full(self._grid.number_of_links, -1, dtype=int)
+        is_positive = self._flow_link_direction == 1
+        is_negative = self._flow_link_direction == -1
+        out[is_positive] = self._grid.node_at_link_tail[is_positive]
+        out[is_negative] = self._grid.node_at_link_head[is_negative]
         return out
 
     def downstream_node_at_link(self):
@@ -722,13 +720,11 @@ class FlowDirectorSteepest(_FlowDirectorToOne):
         >>> fd.downstream_node_at_link()
         array([-1, -1, -1,  1, -1, -1, -1, -1, -1, -1, -1, -1])
         """
-        out = -1 * self._grid.ones(at="link", dtype=int)
-        out[self._flow_link_direction == 1] = self._grid.node_at_link_head[
-            self._flow_link_direction == 1
-        ]
-        out[self._flow_link_direction == -1] = self._grid.node_at_link_tail[
-            self._flow_link_direction == -1
-        ]
+        out = np.full(self._grid.number_of_links, -1, dtype=int)
+        is_positive = self._flow_link_direction == 1
+        is_negative = self._flow_link_direction == -1
+        out[is_positive] = self._grid.node_at_link_head[is_positive]
+        out[is_negative] = self._grid.node_at_link_tail[is_negative]
         return out
 
 
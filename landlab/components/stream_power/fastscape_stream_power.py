@@ -263,6 +263,10 @@ class FastscapeEroder(Component):
         # make storage variables
         self._A_to_the_m = grid.zeros(at="node")
         self._alpha = grid.empty(at="node")
+        if erode_flooded_nodes:
+            self._is_flooded = None
+        else:
+            self._is_flooded = np.empty(grid.number_of_nodes, dtype=bool)
 
     @property
     def K(self):
@@ -288,11 +292,10 @@ class FastscapeEroder(Component):
         dt : float
             Time-step size
         """
-        if not self._erode_flooded_nodes:
+        is_flooded = self._is_flooded
+        if is_flooded is not None:
             flood_status = self._grid.at_node["flood_status_code"]
-            flooded_nodes = np.nonzero(flood_status == _FLOODED)[0]
-        else:
-            flooded_nodes = []
+            np.equal(flood_status, _FLOODED, out=is_flooded)
 
         upstream_order_IDs = self._grid.at_node["flow__upstream_node_order"]
         flow_receivers = self._grid["node"]["flow__receiver_node"]
@@ -324,8 +327,8 @@ class FastscapeEroder(Component):
         )
 
         # Handle flooded nodes, if any (no erosion there)
-        if len(flooded_nodes) > 0:
-            self._alpha[flooded_nodes] = 0.0
+        if is_flooded is not None and np.any(is_flooded):
+            self._alpha[is_flooded] = 0.0
         else:
             reversed_flow = z < z[flow_receivers]
             # this check necessary if flow has been routed across depressions
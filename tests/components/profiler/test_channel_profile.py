@@ -5,7 +5,10 @@ Created on Tue Feb 27 16:25:11 2018
 
 @author: barnhark
 """
+import os
+
 import matplotlib
+import matplotlib.pyplot as plt
 import numpy as np
 import pytest
 
@@ -15,17 +18,50 @@ from landlab.components import (
     DepressionFinderAndRouter,
     FastscapeEroder,
     FlowAccumulator,
-    LinearDiffuser,
 )
 
 matplotlib.use("agg")
 
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    """Close the figures a test leaves open.
+
+    The plotting methods draw onto the current figure so, without this, every
+    test would keep adding collections and colorbars to the same figure.
+    """
+    yield
+    plt.close("all")
+
+
+def _spin_up(mg, fa, components, n_steps, dt, uplift=0.0, outlet_lowering=0.0):
+    """Run n_steps of flow routing followed by each of components.
+
+    Core nodes are raised by uplift at the start of each step and the outlet
+    (node 0) is lowered by outlet_lowering at the end of each step.
+    """
+    z = mg.at_node["topographic__elevation"]
+    core_nodes = mg.core_nodes
+    for _ in range(n_steps):
+        if uplift:
+            z[core_nodes] += uplift
+        fa.run_one_step()
+        for component in components:
+            component.run_one_step(dt=dt)
+        if outlet_lowering:
+            z[0] -= outlet_lowering
+
 
 def test_assertion_error():
     """Test that the correct assertion error will be raised."""
-    mg = RasterModelGrid((10, 10))
+    # The error comes from checking the arguments against each other, so the
+    # smallest grid with a single routing step is enough.
+    mg = RasterModelGrid((5, 5))
     z = mg.add_zeros("topographic__elevation", at="node")
-    z += 200 + mg.x_of_node + mg.y_of_node + np.random.randn(mg.size("node"))
+    rng = np.random.default_rng(12345)
+    z += 200 + mg.x_of_node + mg.y_of_node + rng.standard_normal(mg.size("node"))
 
     mg.set_closed_boundaries_at_grid_edges(
         bottom_is_closed=True,
@@ -37,22 +73,17 @@ def test_assertion_error():
     fa = FlowAccumulator(
         mg, flow_director="D8", depression_finder=DepressionFinderAndRouter
     )
-    sp = FastscapeEroder(mg, K_sp=0.0001, m_sp=0.5, n_sp=1, erode_flooded_nodes=True)
-    ld = LinearDiffuser(mg, linear_diffusivity=0.0001)
-
-    dt = 100
-    for i in range(200):
-        fa.run_one_step()
-        sp.run_one_step(dt=dt)
-        ld.run_one_step(dt=dt)
-        mg.at_node["topographic__elevation"][0] -= 0.001  # Uplift
+    fa.run_one_step()
 
     with pytest.raises(ValueError):
         ChannelProfiler(mg, outlet_nodes=[0], number_of_watersheds=2)
 
 
 def test_asking_for_too_many_watersheds():
-    mg = RasterModelGrid((10, 10))
+    # A closed grid with one outlet only ever has one watershed and its
+    # drainage area is bounded by the number of core cells, so both errors
+    # are raised without evolving the landscape.
+    mg = RasterModelGrid((5, 5))
     z = mg.add_zeros("topographic__elevation", at="node")
     z += 200 + mg.x_of_node + mg.y_of_node
     mg.set_closed_boundaries_at_grid_edges(
@@ -63,13 +94,7 @@ def test_asking_for_too_many_watersheds():
     )
     mg.set_watershed_boundary_condition_outlet_id(0, z, -9999)
     fa = FlowAccumulator(mg, flow_director="D8")
-    sp = FastscapeEroder(mg, K_sp=0.0001, m_sp=0.5, n_sp=1)
-
-    dt = 100
-    for i in range(200):
-        fa.run_one_step()
-        sp.run_one_step(dt=dt)
-        mg.at_node["topographic__elevation"][0] -= 0.001
+    fa.run_one_step()
 
     with pytest.raises(ValueError):
         ChannelProfiler(mg, number_of_watersheds=3)
@@ -79,9 +104,10 @@ def test_asking_for_too_many_watersheds():
 
 
 def test_no_minimum_channel_threshold():
-    mg = RasterModelGrid((10, 10))
+    mg = RasterModelGrid((5, 5))
     z = mg.add_zeros("topographic__elevation", at="node")
-    z += 200 + mg.x_of_node + mg.y_of_node + np.random.randn(mg.size("node"))
+    rng = np.random.default_rng(12345)
+    z += 200 + mg.x_of_node + mg.y_of_node + rng.standard_normal(mg.size("node"))
 
     mg.set_closed_boundaries_at_grid_edges(
         bottom_is_closed=True,
@@ -100,29 +126,41 @@ def test_no_minimum_channel_threshold():
     assert profiler._minimum_channel_threshold == 0.0
 
 
-def test_no_flow__link_to_receiver_node():
-    mg = RasterModelGrid((10, 10))
-    mg.add_zeros("topographic__elevation", at="node")
-    mg.add_zeros("drainage_area", at="node")
-    mg.add_zeros("flow__receiver_node", at="node")
-    with pytest.raises(FieldError):
-        ChannelProfiler(mg)
-
-
-def test_no_flow__receiver_node():
+@pytest.mark.parametrize(
+    "missing",
+    [
+        "topographic__elevation",
+        "drainage_area",
+        "flow__receiver_node",
+        "flow__link_to_receiver_node",
+    ],
+)
+def test_missing_field(missing):
+    fields = [
+        "topographic__elevation",
+        "drainage_area",
+        "flow__receiver_node",
+        "flow__link_to_receiver_node",
+    ]
     mg = RasterModelGrid((10, 10))
-    mg.add_zeros("topographic__elevation", at="node")
-    mg.add_zeros("drainage_area", at="node")
-    mg.add_zeros("flow__link_to_receiver_node", at="node")
+    for name in fields:
+        if name != missing:
+            mg.add_zeros(name, at="node")
     with pytest.raises(FieldError):
         ChannelProfiler(mg)
 
 
-@pytest.fixture()
+@pytest.fixture(scope="module")
 def profile_example_grid():
+    # Elevations are from a spin up of 200 steps of the flow routing and
+    # erosion below, starting from z = 200 + x + y, saved after 199 steps. The
+    # last step is run here so the flow fields match those of the spin up.
     mg = RasterModelGrid((40, 60))
-    z = mg.add_zeros("topographic__elevation", at="node")
-    z += 200 + mg.x_of_node + mg.y_of_node
+    z = mg.add_field(
+        "topographic__elevation",
+        np.loadtxt(os.path.join(_THIS_DIR, "profile_example_grid_elevation.txt")),
+        at="node",
+    )
     mg.set_closed_boundaries_at_grid_edges(
         bottom_is_closed=True,
         left_is_closed=True,
@@ -133,11 +171,7 @@ def profile_example_grid():
     fa = FlowAccumulator(mg, flow_director="D8")
     sp = FastscapeEroder(mg, K_sp=0.0001, m_sp=0.5, n_sp=1)
 
-    dt = 100
-    for i in range(200):
-        fa.run_one_step()
-        sp.run_one_step(dt=dt)
-        mg.at_node["topographic__elevation"][0] -= 0.001
+    _spin_up(mg, fa, [sp], n_steps=1, dt=100, outlet_lowering=0.001)
     return mg
 
 
@@ -148,134 +182,125 @@ def test_start_away_from_boundary(profile_example_grid):
     assert profiler.distance_along_profile[0][0] == 0.0
 
 
-def test_plotting_and_structure(profile_example_grid):
-    mg = profile_example_grid
+# hard to test plotting... but in April 2019 KRB visually verified that the
+# plots were correct and has hard coded in what the profile structure was.
+_ALL_CHANNELS_STRUCTURE = [
+    [0, 61],
+    [61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71],
+    [61, 121, 181, 241, 301, 361, 421, 481, 541, 601, 661, 721, 781],
+    [71, 72, 73, 74, 75],
+    [71, 131, 191, 251, 311, 371, 431, 491, 551],
+    [781, 841, 901, 961, 1021],
+    [781, 842, 843, 844, 845, 846, 847],
+    [75, 76, 77, 78, 79],
+    [
+        75,
+        135,
+        195,
+        255,
+        315,
+        375,
+        435,
+        495,
+        555,
+        615,
+        675,
+        735,
+        795,
+        855,
+        915,
+        975,
+        1035,
+    ],
+    [1021, 1081, 1141, 1201, 1261, 1321],
+    [1021, 1082, 1083, 1084, 1085, 1086, 1087, 1088],
+    [79, 80, 81, 82, 83],
+    [
+        79,
+        139,
+        199,
+        259,
+        319,
+        379,
+        439,
+        499,
+        559,
+        619,
+        679,
+        739,
+        799,
+        859,
+        919,
+        979,
+        1039,
+        1099,
+    ],
+    [1321, 1322, 1323, 1324],
+    [1321, 1381, 1441, 1501, 1561, 1621, 1681, 1741, 1801],
+    [83, 84, 85, 86],
+    [83, 143, 203, 263, 323, 383, 443, 503, 563, 623, 683, 743, 803, 863, 923, 983],
+    [86, 87, 88, 89, 90],
+    [
+        86,
+        147,
+        207,
+        267,
+        327,
+        387,
+        447,
+        507,
+        567,
+        627,
+        687,
+        747,
+        807,
+        867,
+        927,
+        987,
+        1047,
+    ],
+    [90, 91, 92, 93, 94, 95],
+    [90, 151, 211, 271, 331, 391, 451, 511, 571, 631, 691, 751],
+    [95, 96, 97, 98],
+    [95, 155, 215, 275, 335, 395, 455, 515, 575, 635],
+    [98, 99, 100, 101, 102, 103],
+    [98, 159, 219, 279, 339, 399, 459],
+    [103, 104, 105, 106, 107, 108, 109],
+    [103, 163],
+]
+
+_MAIN_CHANNEL_STRUCTURE = [[0, *range(61, 110)]]
+
+
+@pytest.mark.parametrize(
+    "kwds,correct_structure",
+    [
+        (
+            {"number_of_watersheds": 1, "main_channel_only": False},
+            _ALL_CHANNELS_STRUCTURE,
+        ),
+        (
+            {
+                "number_of_watersheds": None,
+                "main_channel_only": True,
+                "minimum_outlet_threshold": 3,
+            },
+            _MAIN_CHANNEL_STRUCTURE,
+        ),
+    ],
+)
+def test_plotting_and_structure(profile_example_grid, kwds, correct_structure):
     profiler = ChannelProfiler(
-        mg,
-        number_of_watersheds=1,
-        main_channel_only=False,
-        minimum_channel_threshold=50,
+        profile_example_grid, minimum_channel_threshold=50, **kwds
     )
     profiler.run_one_step()
 
     profiler.plot_profiles()
     profiler.plot_profiles_in_map_view()
 
-    # hard to test plotting... but in April 2019 KRB visually verified that the
-    # plots were correct and has hard coded in what the profile structure was.
-    correct_structure = np.array(
-        [
-            np.array([0, 61]),
-            np.array([61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71]),
-            np.array([61, 121, 181, 241, 301, 361, 421, 481, 541, 601, 661, 721, 781]),
-            np.array([71, 72, 73, 74, 75]),
-            np.array([71, 131, 191, 251, 311, 371, 431, 491, 551]),
-            np.array([781, 841, 901, 961, 1021]),
-            np.array([781, 842, 843, 844, 845, 846, 847]),
-            np.array([75, 76, 77, 78, 79]),
-            np.array(
-                [
-                    75,
-                    135,
-                    195,
-                    255,
-                    315,
-                    375,
-                    435,
-                    495,
-                    555,
-                    615,
-                    675,
-                    735,
-                    795,
-                    855,
-                    915,
-                    975,
-                    1035,
-                ]
-            ),
-            np.array([1021, 1081, 1141, 1201, 1261, 1321]),
-            np.array([1021, 1082, 1083, 1084, 1085, 1086, 1087, 1088]),
-            np.array([79, 80, 81, 82, 83]),
-            np.array(
-                [
-                    79,
-                    139,
-                    199,
-                    259,
-                    319,
-                    379,
-                    439,
-                    499,
-                    559,
-                    619,
-                    679,
-                    739,
-                    799,
-                    859,
-                    919,
-                    979,
-                    1039,
-                    1099,
-                ]
-            ),
-            np.array([1321, 1322, 1323, 1324]),
-            np.array([1321, 1381, 1441, 1501, 1561, 1621, 1681, 1741, 1801]),
-            np.array([83, 84, 85, 86]),
-            np.array(
-                [
-                    83,
-                    143,
-                    203,
-                    263,
-                    323,
-                    383,
-                    443,
-                    503,
-                    563,
-                    623,
-                    683,
-                    743,
-                    803,
-                    863,
-                    923,
-                    983,
-                ]
-            ),
-            np.array([86, 87, 88, 89, 90]),
-            np.array(
-                [
-                    86,
-                    147,
-                    207,
-                    267,
-                    327,
-                    387,
-                    447,
-                    507,
-                    567,
-                    627,
-                    687,
-                    747,
-                    807,
-                    867,
-                    927,
-                    987,
-                    1047,
-                ]
-            ),
-            np.array([90, 91, 92, 93, 94, 95]),
-            np.array([90, 151, 211, 271, 331, 391, 451, 511, 571, 631, 691, 751]),
-            np.array([95, 96, 97, 98]),
-            np.array([95, 155, 215, 275, 335, 395, 455, 515, 575, 635]),
-            np.array([98, 99, 100, 101, 102, 103]),
-            np.array([98, 159, 219, 279, 339, 399, 459]),
-            np.array([103, 104, 105, 106, 107, 108, 109]),
-            np.array([103, 163]),
-        ]
-    )
-    for idx in range(len(correct_structure)):
-        np.testing.assert_array_equal(profiler.nodes[idx], correct_structure[idx])
+    assert len(profiler.nodes) == len(correct_structure)
+    for idx, expected in enumerate(correct_structure):
+        np.testing.assert_array_equal(profiler.nodes[idx], expected)
 
 
 def test_end_nodes_only(profile_example_grid):
@@ -294,82 +319,10 @@ def test_end_nodes_only(profile_example_grid):
     profiler2.plot_profiles_in_map_view(endpoints_only=True)
 
 
-def test_different_kwargs(profile_example_grid):
-    mg = profile_example_grid
-    # with the same grid, test some other profiler options.
-    profiler2 = ChannelProfiler(
-        mg,
-        number_of_watersheds=None,
-        main_channel_only=True,
-        minimum_outlet_threshold=3,
-        minimum_channel_threshold=50,
-    )
-    profiler2.run_one_step()
-
-    profiler2.plot_profiles()
-    profiler2.plot_profiles_in_map_view()
-
-    correct_structure = np.array(
-        [
-            0,
-            61,
-            62,
-            63,
-            64,
-            65,
-            66,
-            67,
-            68,
-            69,
-            70,
-            71,
-            72,
-            73,
-            74,
-            75,
-            76,
-            77,
-            78,
-            79,
-            80,
-            81,
-            82,
-            83,
-            84,
-            85,
-            86,
-            87,
-            88,
-            89,
-            90,
-            91,
-            92,
-            93,
-            94,
-            95,
-            96,
-            97,
-            98,
-            99,
-            100,
-            101,
-            102,
-            103,
-            104,
-            105,
-            106,
-            107,
-            108,
-            109,
-        ]
-    )
-    np.testing.assert_array_equal(profiler2.nodes[0], correct_structure)
-
-
 def test_re_calculating_nodes_and_distance():
     mg = RasterModelGrid((20, 20), xy_spacing=100)
     z = mg.add_zeros("topographic__elevation", at="node")
-    z += np.random.rand(z.size)
+    z += np.random.default_rng(12345).random(z.size)
     mg.set_closed_boundaries_at_grid_edges(
         bottom_is_closed=False,
         left_is_closed=True,
@@ -381,12 +334,7 @@ def test_re_calculating_nodes_and_distance():
     sp = FastscapeEroder(mg, K_sp=0.0001, m_sp=0.5, n_sp=1)
 
     dt = 1000
-    uplift_per_step = 0.001 * dt
-
-    for i in range(10):
-        z[mg.core_nodes] += uplift_per_step
-        fa.run_one_step()
-        sp.run_one_step(dt=dt)
+    _spin_up(mg, fa, [sp], n_steps=10, dt=dt, uplift=0.001 * dt)
 
     profiler = ChannelProfiler(mg)
     profiler.run_one_step()
@@ -425,21 +373,15 @@ def test_re_calculating_nodes_and_distance():
 @pytest.mark.parametrize("main", [True, False])
 @pytest.mark.parametrize("nshed", [1, None, 3])
 def test_getting_all_the_way_to_the_divide(main, nshed):
-    np.random.seed(42)
     mg = RasterModelGrid((10, 12))
     z = mg.add_zeros("topographic__elevation", at="node")
-    z += np.random.rand(z.size)
+    z += np.random.default_rng(42).random(z.size)
 
     fa = FlowAccumulator(mg, flow_director="D8")
     sp = FastscapeEroder(mg, K_sp=0.0001, m_sp=0.5, n_sp=1)
 
     dt = 1000
-    uplift_per_step = 0.001 * dt
-
-    for i in range(100):
-        z[mg.core_nodes] += uplift_per_step
-        fa.run_one_step()
-        sp.run_one_step(dt=dt)
+    _spin_up(mg, fa, [sp], n_steps=100, dt=dt, uplift=0.001 * dt)
 
     profiler = ChannelProfiler(
         mg,